@@ -18,6 +18,8 @@ import sys
 import time
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ANSI colors for nice output
 GREEN = "\033[92m"
@@ -47,7 +49,20 @@ def print_error(text: str):
     sys.exit(1)
 
 
-def run_demo(base_url: str):
+def create_session() -> requests.Session:
+    """Create a session that keeps connections to the API alive between calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=0.1)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def run_demo(base_url: str, session: requests.Session):
     """Run the full demo scenario."""
     
     print_header("Agent Identity Registry - Demo Scenario")
@@ -56,7 +71,7 @@ def run_demo(base_url: str):
     
     # Reset database for clean demo
     print_step(0, "Resetting database for clean demo...")
-    r = requests.post(f"{base_url}/admin/reset")
+    r = session.post(f"{base_url}/admin/reset")
     if r.status_code != 200:
         print_error(f"Failed to reset: {r.text}")
     print("  ✓ Database reset\n")
@@ -75,7 +90,7 @@ def run_demo(base_url: str):
         "scope": ["read:database", "write:reports", "create:charts"]
     }
     
-    r = requests.post(f"{base_url}/agents/register", json=agent_a_request)
+    r = session.post(f"{base_url}/agents/register", json=agent_a_request)
     if r.status_code != 200:
         print_error(f"Failed to register Agent A: {r.text}")
     
@@ -96,7 +111,7 @@ def run_demo(base_url: str):
         "scope": ["write:reports"]
     }
     
-    r = requests.post(
+    r = session.post(
         f"{base_url}/agents/{agent_a['agent_id']}/spawn",
         json=agent_b_request
     )
@@ -123,7 +138,7 @@ def run_demo(base_url: str):
         "scope": ["create:charts"]  # NOT in B's scope!
     }
     
-    r = requests.post(
+    r = session.post(
         f"{base_url}/agents/{agent_b['agent_id']}/spawn",
         json=agent_c_invalid
     )
@@ -141,7 +156,7 @@ def run_demo(base_url: str):
         "scope": ["create:charts"]
     }
     
-    r = requests.post(
+    r = session.post(
         f"{base_url}/agents/{agent_a['agent_id']}/spawn",
         json=agent_c_request
     )
@@ -164,21 +179,23 @@ def run_demo(base_url: str):
         (agent_a['agent_id'], "write:reports", "final_analysis.pdf", "Agent A compiles final analysis"),
     ]
     
-    for i, (agent_id, action, resource, desc) in enumerate(actions, 1):
-        print_step(3 + i, desc)
-        
-        log_request = {
+    events = [
+        {
             "agent_id": agent_id,
             "action": action,
             "resource": resource,
             "success": True
         }
-        
-        r = requests.post(f"{base_url}/audit/log", json=log_request)
-        if r.status_code != 200:
-            print_error(f"Failed to log action: {r.text}")
-        
-        result = r.json()
+        for agent_id, action, resource, _ in actions
+    ]
+    
+    # One request logs every action in a single transaction
+    r = session.post(f"{base_url}/audit/log/batch", json={"events": events})
+    if r.status_code != 200:
+        print_error(f"Failed to log actions: {r.text}")
+    
+    for i, ((agent_id, action, resource, desc), result) in enumerate(zip(actions, r.json()), 1):
+        print_step(3 + i, desc)
         print(f"  → Action: {action}")
         print(f"  → Resource: {resource}")
         print(f"  → Human authority traced: {BOLD}{result['human_authority']}{RESET}")
@@ -190,7 +207,7 @@ def run_demo(base_url: str):
     print_step(9, "Query: 'Show me Agent C's full audit trace'")
     print("  → Who authorized Agent C? What has it done?\n")
     
-    r = requests.get(f"{base_url}/audit/trace/{agent_c['agent_id']}")
+    r = session.get(f"{base_url}/audit/trace/{agent_c['agent_id']}")
     if r.status_code != 200:
         print_error(f"Failed to get audit trace: {r.text}")
     
@@ -206,7 +223,7 @@ def run_demo(base_url: str):
     print(f"\n  ✓ Every action by Agent C traces back to: {BOLD}user:jun@apra.gov.au{RESET}")
     
     print_step(10, "Query: 'Show all actions authorized by Jun'")
-    r = requests.get(f"{base_url}/audit/query", params={"human_authority": "user:jun@apra.gov.au"})
+    r = session.get(f"{base_url}/audit/query", params={"human_authority": "user:jun@apra.gov.au"})
     if r.status_code != 200:
         print_error(f"Failed to query: {r.text}")
     
@@ -220,7 +237,7 @@ def run_demo(base_url: str):
     # Final summary
     print_header("DEMO COMPLETE")
     
-    r = requests.get(f"{base_url}/admin/stats")
+    r = session.get(f"{base_url}/admin/stats")
     stats = r.json()
     
     print(f"""
@@ -252,15 +269,17 @@ def main():
     )
     args = parser.parse_args()
     
+    session = create_session()
+    
     # Check if server is running
     try:
-        r = requests.get(f"{args.base_url}/health", timeout=5)
+        r = session.get(f"{args.base_url}/health", timeout=5)
         if r.status_code != 200:
             print_error(f"Server not healthy: {r.status_code}")
     except requests.exceptions.ConnectionError:
         print_error(f"Cannot connect to {args.base_url}. Is the server running?")
     
-    run_demo(args.base_url)
+    run_demo(args.base_url, session)
 
 
 if __name__ == "__main__":
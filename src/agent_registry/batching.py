@@ -0,0 +1,109 @@
+"""Group commit for audit log writes."""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .database import log_action, log_actions_bulk
+
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", "100"))
+
+
+class AuditBatcher:
+    """Buffer audit events and write each batch in a single transaction.
+
+    A batch is whatever has queued up while the previous one was being
+    written (up to `batch_size` events), so a lone event is written straight
+    away and batches only grow under load. Callers wait until their batch has
+    committed, so a logged action is durable and visible to reads as soon as
+    `log` returns. When the batcher is not running (e.g. outside the app
+    lifespan) events are written directly instead.
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the flush task on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued, then stop the flush task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def log(self, event: dict) -> Optional[dict]:
+        """Log one event (keys as for `log_action`). Returns None if the agent does not exist."""
+        if not self.running:
+            return await run_in_threadpool(log_action, **event)
+
+        # Stamp on arrival so batched events keep their request order
+        event["timestamp"] = time.time_ns()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((event, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            # Never wait for more events: take only those already queued
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]):
+        try:
+            results = await run_in_threadpool(
+                log_actions_bulk, [event for event, _ in batch], missing_ok=True
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                _resolve(batch[0][1], error=e)
+                return
+            # The batch rolled back as a whole; write its events one at a time
+            # so only the offending event fails
+            for event, future in batch:
+                try:
+                    [result] = await run_in_threadpool(log_actions_bulk, [event], missing_ok=True)
+                except Exception as error:
+                    _resolve(future, error=error)
+                else:
+                    _resolve(future, result)
+            return
+
+        for (_, future), result in zip(batch, results):
+            _resolve(future, result)
+
+
+def _resolve(future: asyncio.Future, result: Optional[dict] = None, error: Optional[Exception] = None):
+    """Complete a waiting request's future, unless it was cancelled (client went away)."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
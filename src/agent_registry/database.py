@@ -1,14 +1,19 @@
 """Database layer for Agent Identity Registry."""
 import sqlite3
-import json
 import secrets
+import threading
 import time
+import weakref
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
 
 import os
 
+from . import serialization
+
 # Use /tmp for serverless environments (Vercel), otherwise use local data dir
 if os.environ.get("VERCEL") or os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
     DATABASE_PATH = Path("/tmp/registry.db")
@@ -16,6 +21,45 @@ else:
     DATABASE_PATH = Path(__file__).parent.parent.parent / "data" / "registry.db"
 
 
+# Applied to every new connection. journal_mode is persistent on the file,
+# but setting it here puts every connection in WAL however the file was made.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+@dataclass(slots=True)
+class AgentRow:
+    """An agent's public record, built straight from a result tuple."""
+    agent_id: str
+    agent_name: str
+    agent_type: str
+    created_at: int
+    created_by: Optional[str]
+    authority_source: str
+    scope: list[str]
+    lifecycle_state: str
+    human_authority: Optional[str]
+    delegation_depth: int
+
+
+def _agent_row(row: tuple) -> AgentRow:
+    """Build an AgentRow from a tuple selected in _AGENT_ROW_COLUMNS order."""
+    (agent_id, agent_name, agent_type, created_at, created_by,
+     authority_source, scope_json, lifecycle_state, human_authority, delegation_depth) = row
+    return AgentRow(
+        agent_id, agent_name, agent_type, created_at, created_by, authority_source,
+        serialization.loads(scope_json) if scope_json else [],
+        lifecycle_state, human_authority, delegation_depth
+    )
+
+
+@lru_cache(maxsize=None)
 def get_db_path() -> Path:
     """Get database path, creating directory if needed."""
     if not str(DATABASE_PATH).startswith("/tmp"):
@@ -23,21 +67,162 @@ def get_db_path() -> Path:
     return DATABASE_PATH
 
 
+class _ThreadConnection:
+    """A thread's read connection, closed when the thread's locals are freed."""
+    __slots__ = ("conn", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.generation = generation
+
+    def __del__(self):
+        self.conn.close()
+
+
+# One read connection per thread. Threadpool workers come and go, so the
+# registry only holds weak references: a connection lives as long as its thread.
+_local = threading.local()
+_connections: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+_connections_lock = threading.Lock()
+_generation = 0
+
+# Writes share a single connection; the lock makes writers queue in-process
+# rather than contending for SQLite's database lock
+_write_conn: Optional[sqlite3.Connection] = None
+_write_generation = -1
+_write_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    """Open and configure a new database connection."""
+    conn = sqlite3.connect(
+        get_db_path(),
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=256
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 @contextmanager
 def get_connection():
-    """Get a database connection with row factory."""
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
+    """Get this thread's database connection, opening it on first use."""
+    holder = getattr(_local, "holder", None)
+    if holder is None or holder.generation != _generation:
+        holder = _ThreadConnection(_connect(), _generation)
+        with _connections_lock:
+            _connections.add(holder)
+        _local.holder = holder
+    conn = holder.conn
     try:
         yield conn
-    finally:
-        conn.close()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+@contextmanager
+def transaction():
+    """Run a block of writes as a single transaction on the shared write connection."""
+    global _write_conn, _write_generation
+    with _write_lock:
+        if _write_conn is None or _write_generation != _generation:
+            _write_conn = _connect()
+            _write_generation = _generation
+        conn = _write_conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def close_connections():
+    """Close every pooled connection (called on application shutdown)."""
+    global _generation, _write_conn
+    with _write_lock, _connections_lock:
+        for holder in list(_connections):
+            holder.conn.close()
+        _connections.clear()
+        if _write_conn is not None:
+            _write_conn.close()
+            _write_conn = None
+        _generation += 1
+
+
+def _is_human_identity(identity: Optional[str]) -> bool:
+    """Check whether an identity names a human rather than an agent."""
+    return bool(identity) and (identity.startswith("user:") or identity.startswith("human:"))
+
+
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> bool:
+    """Add a column to a table created by an older schema. Returns True if added."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if any(row["name"] == column for row in cursor.fetchall()):
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+# Bump when init_db() gains new DDL or migrations, so existing files rerun it
+SCHEMA_VERSION = 3
+
+
+# Timestamps were stored in whole seconds before moving to nanoseconds;
+# any value below this is still in seconds (it is ~31,700 years of seconds)
+_LEGACY_SECONDS_LIMIT = 10**12
+
+
+def _migrate_timestamps_to_ns(cursor: sqlite3.Cursor):
+    """Convert timestamps written by older versions from seconds to nanoseconds."""
+    cursor.execute("SELECT 1 FROM agents WHERE created_at < ? LIMIT 1", (_LEGACY_SECONDS_LIMIT,))
+    if cursor.fetchone() is None:
+        return
+    for table, column in (
+        ("agents", "created_at"),
+        ("agents", "terminated_at"),
+        ("agents", "api_key_expires_at"),
+        ("delegations", "delegated_at"),
+        ("audit_log", "timestamp"),
+    ):
+        cursor.execute(
+            f"UPDATE {table} SET {column} = {column} * 1000000000 WHERE {column} < ?",
+            (_LEGACY_SECONDS_LIMIT,)
+        )
+
+
+def _schema_version(cursor: sqlite3.Cursor) -> int:
+    """Read the schema version recorded in the database file."""
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
 
 
 def init_db():
-    """Initialize the database schema."""
+    """Initialize the database schema.
+
+    Returns immediately once the file's user_version matches SCHEMA_VERSION,
+    so repeated calls don't take the schema lock.
+    """
     with get_connection() as conn:
         cursor = conn.cursor()
+        if _schema_version(cursor) == SCHEMA_VERSION:
+            return
+    
+    with transaction() as conn:
+        cursor = conn.cursor()
+        
+        # Another process may have finished the upgrade while we waited
+        if _schema_version(cursor) == SCHEMA_VERSION:
+            return
+        
+        # All timestamps are Unix time in nanoseconds
         
         # Agents table
         cursor.execute("""
@@ -52,14 +237,16 @@ def init_db():
                 lifecycle_state TEXT CHECK(lifecycle_state IN ('active', 'suspended', 'terminated')) DEFAULT 'active',
                 terminated_at INTEGER,
                 api_key TEXT,
-                api_key_expires_at INTEGER
+                api_key_expires_at INTEGER,
+                human_authority TEXT,
+                delegation_depth INTEGER NOT NULL DEFAULT 0
             )
         """)
         
         # Delegations table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS delegations (
-                delegation_id TEXT PRIMARY KEY,
+                delegation_id BLOB PRIMARY KEY,
                 parent_id TEXT NOT NULL,
                 child_id TEXT NOT NULL,
                 delegated_at INTEGER NOT NULL,
@@ -72,7 +259,7 @@ def init_db():
         # Audit log table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS audit_log (
-                log_id TEXT PRIMARY KEY,
+                log_id BLOB PRIMARY KEY,
                 agent_id TEXT NOT NULL,
                 action TEXT NOT NULL,
                 resource TEXT,
@@ -84,18 +271,185 @@ def init_db():
             )
         """)
         
+        # Older databases predate the denormalized human_authority column
+        if _add_column_if_missing(cursor, "agents", "human_authority", "TEXT"):
+            cursor.execute("SELECT agent_id FROM agents")
+            for row in cursor.fetchall():
+                authority = next(
+                    (link["id"] for link in get_delegation_chain(row["agent_id"])
+                     if link["type"] == "human"),
+                    None
+                )
+                cursor.execute(
+                    "UPDATE agents SET human_authority = ? WHERE agent_id = ?",
+                    (authority, row["agent_id"])
+                )
+        
+        if _add_column_if_missing(cursor, "agents", "delegation_depth", "INTEGER NOT NULL DEFAULT 0"):
+            cursor.execute("""
+                UPDATE agents SET delegation_depth = COALESCE(
+                    (SELECT d.delegation_depth FROM delegations d WHERE d.child_id = agents.agent_id),
+                    0
+                )
+            """)
+        
+        _migrate_timestamps_to_ns(cursor)
+        
         # Create indexes for common queries
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_human ON agents(human_authority)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_agents_created ON agents(created_at, agent_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_delegations_parent ON delegations(parent_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_delegations_child ON delegations(child_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_agent ON audit_log(agent_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log(timestamp)")
+        # Audit queries list newest first with log_id breaking timestamp ties,
+        # so each index ends in (timestamp DESC, log_id DESC) and no sort is
+        # needed. These replace earlier indexes that lacked the tiebreaker.
+        for old_index in (
+            "idx_audit_agent", "idx_audit_agent_ts", "idx_audit_timestamp",
+            "idx_audit_action_ts", "idx_audit_cover",
+        ):
+            cursor.execute(f"DROP INDEX IF EXISTS {old_index}")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_log(timestamp DESC, log_id DESC)"
+        )
+        # Serves both per-agent filters and the newest-first audit trail
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_agent_time
+            ON audit_log(agent_id, timestamp DESC, log_id DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_action_time
+            ON audit_log(action, timestamp DESC, log_id DESC)
+        """)
+        # Covers the "everything authorized by this human" query without table lookups
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_audit_human_cover ON audit_log(
+                human_authority, timestamp DESC, log_id DESC, agent_id, action, resource, success
+            )
+        """)
         
-        conn.commit()
+        cursor.execute("ANALYZE")
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# Statements issued after start-up. Keeping each one as a single shared string
+# lets sqlite3's per-connection statement cache reuse the compiled statement.
+_SQL_INSERT_AGENT = """
+    INSERT INTO agents (
+        agent_id, agent_name, agent_type, created_at, created_by,
+        authority_source, scope_json, lifecycle_state, api_key, api_key_expires_at,
+        human_authority, delegation_depth
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, 'active', ?, ?, ?, ?)
+"""
+_AGENT_ROW_COLUMNS = """
+    agent_id, agent_name, agent_type, created_at, created_by,
+    authority_source, scope_json, lifecycle_state, human_authority, delegation_depth
+"""
+_SQL_GET_AGENT = "SELECT * FROM agents WHERE agent_id = ?"
+_SQL_GET_AGENT_ROW = f"SELECT {_AGENT_ROW_COLUMNS} FROM agents WHERE agent_id = ?"
+_SQL_GET_AGENT_BY_API_KEY = "SELECT * FROM agents WHERE api_key = ? AND lifecycle_state = 'active'"
+_SQL_INSERT_DELEGATION = """
+    INSERT INTO delegations (delegation_id, parent_id, child_id, delegated_at, delegation_depth)
+    VALUES (?, ?, ?, ?, ?)
+"""
+_SQL_GET_DELEGATION_CHAIN = """
+    WITH RECURSIVE chain(agent_id, parent_id, depth) AS (
+        SELECT a.agent_id, d.parent_id, 0
+        FROM agents a
+        LEFT JOIN delegations d ON d.child_id = a.agent_id
+        WHERE a.agent_id = ?
+        UNION ALL
+        SELECT a.agent_id, d.parent_id, c.depth + 1
+        FROM chain c
+        JOIN agents a ON a.agent_id = c.parent_id
+        LEFT JOIN delegations d ON d.child_id = a.agent_id
+    )
+    SELECT c.agent_id, c.parent_id, a.agent_name, a.created_by
+    FROM chain c
+    JOIN agents a ON a.agent_id = c.agent_id
+    ORDER BY c.depth DESC
+"""
+_SQL_GET_AGENT_SCOPE = "SELECT scope_json FROM agents WHERE agent_id = ?"
+# The agent IDs are bound as one JSON array, so any number of them share a statement
+_SQL_GET_HUMAN_AUTHORITIES = """
+    SELECT agent_id, human_authority FROM agents
+    WHERE agent_id IN (SELECT value FROM json_each(?))
+"""
+_SQL_LOG_ACTION = """
+    INSERT INTO audit_log (
+        log_id, agent_id, action, resource, timestamp,
+        human_authority, success, metadata_json
+    )
+    SELECT ?, agent_id, ?, ?, ?, human_authority, ?, ?
+    FROM agents WHERE agent_id = ?
+    RETURNING human_authority
+"""
+_SQL_INSERT_AUDIT_LOG = """
+    INSERT INTO audit_log (
+        log_id, agent_id, action, resource, timestamp,
+        human_authority, success, metadata_json
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Batched events share a timestamp; log IDs are time-ordered, so they break ties
+_SQL_GET_AUDIT_TRAIL = """
+    SELECT log_id, action, resource, timestamp, success, metadata_json
+    FROM audit_log
+    WHERE agent_id = ?
+    ORDER BY timestamp DESC, log_id DESC
+"""
+# {where} is built from a fixed set of filters, so only a few variants exist
+_SQL_QUERY_AUDIT_LOGS = """
+    SELECT al.log_id, al.agent_id, al.action, al.resource, al.timestamp,
+           al.human_authority, al.success, a.agent_name
+    FROM audit_log al
+    LEFT JOIN agents a ON al.agent_id = a.agent_id
+    WHERE {where}
+    ORDER BY al.timestamp DESC, al.log_id DESC
+    LIMIT ?
+"""
+_SQL_TERMINATE_CASCADE = """
+    WITH RECURSIVE descendants(id) AS (
+        SELECT ?
+        UNION
+        SELECT d.child_id FROM delegations d
+        JOIN descendants x ON d.parent_id = x.id
+    )
+    UPDATE agents SET lifecycle_state = 'terminated', terminated_at = ?
+    WHERE agent_id IN (SELECT id FROM descendants)
+      AND (agent_id = ? OR lifecycle_state = 'active')
+    RETURNING agent_id
+"""
+_SQL_TERMINATE_AGENT = """
+    UPDATE agents SET lifecycle_state = 'terminated', terminated_at = ?
+    WHERE agent_id = ?
+"""
+_SQL_COUNT_AGENTS_BY_STATE = "SELECT lifecycle_state, COUNT(*) FROM agents GROUP BY lifecycle_state"
+_SQL_COUNT_AUDIT_LOGS = "SELECT COUNT(*) FROM audit_log"
+# Agents newest first, rendered by SQLite as JSON objects so the stored
+# scope_json is embedded as-is instead of decoded and re-encoded.
+# {where} is built from a fixed set of filters, so only a few variants exist
+_SQL_LIST_AGENTS_JSON = """
+    SELECT json_object(
+        'agent_id', agent_id, 'agent_name', agent_name, 'agent_type', agent_type,
+        'created_at', created_at, 'created_by', created_by,
+        'authority_source', authority_source,
+        'scope', json(coalesce(scope_json, '[]')),
+        'lifecycle_state', lifecycle_state, 'human_authority', human_authority,
+        'delegation_depth', delegation_depth
+    )
+    FROM agents
+    WHERE {where}
+    ORDER BY created_at DESC, agent_id DESC
+    LIMIT ?
+"""
 
 
 def generate_agent_id() -> str:
-    """Generate a unique agent ID."""
-    return f"agent_{secrets.token_hex(8)}"
+    """Generate a unique, time-ordered agent ID.
+
+    IDs sort in creation order, so new agents append to the end of the
+    primary key index instead of landing at random positions in it.
+    """
+    return f"agent_{_next_ulid().hex()}"
 
 
 def generate_api_key() -> str:
@@ -103,42 +457,75 @@ def generate_api_key() -> str:
     return f"air_{secrets.token_urlsafe(32)}"
 
 
-def generate_log_id() -> str:
-    """Generate a unique log ID."""
-    return f"log_{secrets.token_hex(8)}"
+# State for _next_ulid(): last millisecond issued and the counter within it
+_ulid_lock = threading.Lock()
+_ulid_last_ms = 0
+_ulid_counter = 0
+_ULID_COUNTER_MAX = (1 << 80) - 1
+
+
+def _next_ulid() -> bytes:
+    """Generate a 16-byte, time-ordered ID (48-bit ms timestamp + 80-bit counter).
+
+    The counter is seeded from urandom once per millisecond and incremented
+    for further IDs in the same millisecond, so IDs are strictly increasing
+    and new rows append to the end of the primary key index.
+    """
+    global _ulid_last_ms, _ulid_counter
+    now_ms = time.time_ns() // 1_000_000
+    with _ulid_lock:
+        if now_ms > _ulid_last_ms:
+            _ulid_last_ms = now_ms
+            _ulid_counter = int.from_bytes(os.urandom(10), "big")
+        elif _ulid_counter < _ULID_COUNTER_MAX:
+            _ulid_counter += 1
+        else:
+            _ulid_last_ms += 1
+            _ulid_counter = 0
+        value = (_ulid_last_ms << 80) | _ulid_counter
+    return value.to_bytes(16, "big")
 
 
-def generate_delegation_id() -> str:
-    """Generate a unique delegation ID."""
-    return f"del_{secrets.token_hex(8)}"
+def generate_log_id() -> bytes:
+    """Generate a unique log ID (stored as a 16-byte BLOB)."""
+    return _next_ulid()
 
 
-def register_agent(
+def _format_log_id(log_id) -> str:
+    """Render a stored log ID for API responses."""
+    # Rows written before log IDs became BLOBs hold the text form already
+    if isinstance(log_id, str):
+        return log_id
+    return f"log_{log_id.hex()}"
+
+
+def generate_delegation_id() -> bytes:
+    """Generate a unique delegation ID (stored as a 16-byte BLOB)."""
+    return _next_ulid()
+
+
+def _insert_agent(
+    cursor: sqlite3.Cursor,
     agent_name: str,
     agent_type: str,
     created_by: str,
     authority_source: str,
     scope: list[str],
+    human_authority: Optional[str],
+    delegation_depth: int,
     api_key_ttl_seconds: int = 86400 * 365  # 1 year default
 ) -> dict:
-    """Register a new agent and return credentials."""
+    """Insert an agent and its scopes within the caller's transaction."""
     agent_id = generate_agent_id()
     api_key = generate_api_key()
-    now = int(time.time())
-    expires_at = now + api_key_ttl_seconds
+    now = time.time_ns()
+    expires_at = now + api_key_ttl_seconds * 1_000_000_000
     
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO agents (
-                agent_id, agent_name, agent_type, created_at, created_by,
-                authority_source, scope_json, lifecycle_state, api_key, api_key_expires_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, 'active', ?, ?)
-        """, (
-            agent_id, agent_name, agent_type, now, created_by,
-            authority_source, json.dumps(scope), api_key, expires_at
-        ))
-        conn.commit()
+    cursor.execute(_SQL_INSERT_AGENT, (
+        agent_id, agent_name, agent_type, now, created_by,
+        authority_source, serialization.dumps(scope).decode(), api_key, expires_at,
+        human_authority, delegation_depth
+    ))
     
     return {
         "agent_id": agent_id,
@@ -149,14 +536,40 @@ def register_agent(
     }
 
 
-def get_agent(agent_id: str) -> Optional[dict]:
+def register_agent(
+    agent_name: str,
+    agent_type: str,
+    created_by: str,
+    authority_source: str,
+    scope: list[str],
+    api_key_ttl_seconds: int = 86400 * 365  # 1 year default
+) -> dict:
+    """Register a new agent and return credentials."""
+    human_authority = created_by if _is_human_identity(created_by) else None
+    
+    with transaction() as conn:
+        return _insert_agent(
+            conn.cursor(),
+            agent_name=agent_name,
+            agent_type=agent_type,
+            created_by=created_by,
+            authority_source=authority_source,
+            scope=scope,
+            human_authority=human_authority,
+            delegation_depth=0,
+            api_key_ttl_seconds=api_key_ttl_seconds
+        )
+
+
+def get_agent(agent_id: str) -> Optional[AgentRow]:
     """Get agent by ID."""
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM agents WHERE agent_id = ?", (agent_id,))
+        cursor.row_factory = None
+        cursor.execute(_SQL_GET_AGENT_ROW, (agent_id,))
         row = cursor.fetchone()
         if row:
-            return dict(row)
+            return _agent_row(row)
     return None
 
 
@@ -164,22 +577,40 @@ def get_agent_by_api_key(api_key: str) -> Optional[dict]:
     """Get agent by API key."""
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM agents WHERE api_key = ? AND lifecycle_state = 'active'",
-            (api_key,)
-        )
+        cursor.execute(_SQL_GET_AGENT_BY_API_KEY, (api_key,))
         row = cursor.fetchone()
         if row:
             return dict(row)
     return None
 
 
-def get_agent_scope(agent_id: str) -> list[str]:
-    """Get agent's scope as a list."""
-    agent = get_agent(agent_id)
-    if agent and agent["scope_json"]:
-        return json.loads(agent["scope_json"])
-    return []
+@lru_cache(maxsize=4096)
+def _load_agent_scope(agent_id: str) -> tuple[tuple[str, ...], frozenset[str]]:
+    """Read an agent's scope. Raises KeyError if the agent does not exist."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(_SQL_GET_AGENT_SCOPE, (agent_id,))
+        row = cursor.fetchone()
+    if row is None:
+        raise KeyError(agent_id)
+    scope = tuple(serialization.loads(row[0])) if row[0] else ()
+    return scope, frozenset(scope)
+
+
+def get_cached_agent_scope(agent_id: str) -> Optional[tuple[tuple[str, ...], frozenset[str]]]:
+    """Look up an agent's scope, in order and as a set for membership checks.
+
+    Returns None if the agent does not exist. Scope is fixed when an agent is
+    created, so found scopes are cached for the life of the process and only
+    dropped when the database is reset. Misses are not cached, since the
+    agent may be registered later. Lifecycle state can change and is
+    deliberately not cached.
+    """
+    try:
+        return _load_agent_scope(agent_id)
+    except KeyError:
+        return None
 
 
 def spawn_agent(
@@ -189,44 +620,42 @@ def spawn_agent(
     scope: list[str]
 ) -> dict:
     """Create a sub-agent with delegated authority."""
-    parent = get_agent(parent_id)
-    if not parent:
-        raise ValueError(f"Parent agent {parent_id} not found")
-    
-    if parent["lifecycle_state"] != "active":
-        raise ValueError(f"Parent agent {parent_id} is not active")
-    
-    # Get parent scope
-    parent_scope = json.loads(parent["scope_json"]) if parent["scope_json"] else []
-    
-    # Enforce scope attenuation - child can't have more than parent
-    invalid_scopes = [s for s in scope if s not in parent_scope]
-    if invalid_scopes:
-        raise ValueError(f"Scope attenuation violation: {invalid_scopes} not in parent scope")
-    
-    # Calculate delegation depth
-    parent_depth = get_delegation_depth(parent_id)
-    child_depth = parent_depth + 1
-    
-    # Register the new agent
-    result = register_agent(
-        agent_name=agent_name,
-        agent_type=agent_type,
-        created_by=parent_id,
-        authority_source="delegated",
-        scope=scope
-    )
-    
-    child_id = result["agent_id"]
-    
-    # Create delegation record
-    with get_connection() as conn:
+    # The parent checks, child insert and delegation record commit together
+    with transaction() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO delegations (delegation_id, parent_id, child_id, delegated_at, delegation_depth)
-            VALUES (?, ?, ?, ?, ?)
-        """, (generate_delegation_id(), parent_id, child_id, int(time.time()), child_depth))
-        conn.commit()
+        cursor.execute(_SQL_GET_AGENT, (parent_id,))
+        parent = cursor.fetchone()
+        if not parent:
+            raise ValueError(f"Parent agent {parent_id} not found")
+        
+        if parent["lifecycle_state"] != "active":
+            raise ValueError(f"Parent agent {parent_id} is not active")
+        
+        # Enforce scope attenuation - child can't have more than parent
+        parent_scope = frozenset(serialization.loads(parent["scope_json"] or "[]"))
+        invalid_scopes = [s for s in scope if s not in parent_scope]
+        if invalid_scopes:
+            raise ValueError(f"Scope attenuation violation: {invalid_scopes} not in parent scope")
+        
+        child_depth = parent["delegation_depth"] + 1
+        
+        # Authority is inherited from the parent, not the parent's own ID
+        result = _insert_agent(
+            cursor,
+            agent_name=agent_name,
+            agent_type=agent_type,
+            created_by=parent_id,
+            authority_source="delegated",
+            scope=scope,
+            human_authority=parent["human_authority"],
+            delegation_depth=child_depth
+        )
+        child_id = result["agent_id"]
+        
+        cursor.execute(
+            _SQL_INSERT_DELEGATION,
+            (generate_delegation_id(), parent_id, child_id, time.time_ns(), child_depth)
+        )
     
     # Get full delegation chain
     chain = get_delegation_chain(child_id)
@@ -239,73 +668,33 @@ def spawn_agent(
     }
 
 
-def get_delegation_depth(agent_id: str) -> int:
-    """Get the delegation depth of an agent (0 = human-authorized)."""
+def get_delegation_chain(agent_id: str) -> list[dict]:
+    """Get the full delegation chain for an agent."""
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT delegation_depth FROM delegations WHERE child_id = ?",
-            (agent_id,)
-        )
-        row = cursor.fetchone()
-        if row:
-            return row["delegation_depth"]
+        cursor.execute(_SQL_GET_DELEGATION_CHAIN, (agent_id,))
+        rows = cursor.fetchall()
     
-    # If no delegation record, check if human-authorized
-    agent = get_agent(agent_id)
-    if agent and agent["authority_source"] == "human":
-        return 0
-    return 0
-
-
-def get_delegation_chain(agent_id: str) -> list[dict]:
-    """Get the full delegation chain for an agent."""
+    if not rows:
+        return []
+    
+    # Rows run from the topmost ancestor down to the agent itself
     chain = []
-    current_id = agent_id
+    root = rows[0]
+    created_by = root["created_by"]
+    if root["parent_id"] is None and _is_human_identity(created_by):
+        chain.append({"type": "human", "id": created_by, "name": None})
     
-    while current_id:
-        agent = get_agent(current_id)
-        if not agent:
-            break
-        
-        if current_id.startswith("user:") or current_id.startswith("human:"):
-            chain.append({"type": "human", "id": current_id})
-            break
-        
-        chain.append({
-            "type": "agent",
-            "id": current_id,
-            "name": agent["agent_name"]
-        })
-        
-        # Look for parent
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT parent_id FROM delegations WHERE child_id = ?",
-                (current_id,)
-            )
-            row = cursor.fetchone()
-            if row:
-                current_id = row["parent_id"]
-            else:
-                # No parent in delegations, check created_by
-                created_by = agent["created_by"]
-                if created_by and (created_by.startswith("user:") or created_by.startswith("human:")):
-                    chain.append({"type": "human", "id": created_by})
-                break
-    
-    # Reverse to show human → agent order
-    return list(reversed(chain))
-
-
-def get_human_authority(agent_id: str) -> Optional[str]:
-    """Trace back to find the human authority for an agent."""
-    chain = get_delegation_chain(agent_id)
-    for item in chain:
-        if item["type"] == "human":
-            return item["id"]
-    return None
+    chain.extend(
+        {"type": "agent", "id": row["agent_id"], "name": row["agent_name"]}
+        for row in rows
+    )
+    return chain
+
+
+def encode_metadata(metadata: Optional[dict]) -> Optional[str]:
+    """Encode audit metadata for storage. Raises TypeError/ValueError if it can't be."""
+    return serialization.dumps(metadata).decode() if metadata else None
 
 
 def log_action(
@@ -313,34 +702,91 @@ def log_action(
     action: str,
     resource: Optional[str] = None,
     success: bool = True,
-    metadata: Optional[dict] = None
-) -> dict:
-    """Log an agent action with full traceability."""
+    metadata: Optional[dict] = None,
+    metadata_json: Optional[str] = None
+) -> Optional[dict]:
+    """Log an agent action with full traceability.
+
+    `metadata_json` may be passed instead of `metadata` when the caller has
+    already encoded it. Returns None if the agent does not exist.
+    """
     log_id = generate_log_id()
-    now = int(time.time())
-    human_authority = get_human_authority(agent_id)
+    now = time.time_ns()
     
-    with get_connection() as conn:
+    # Authority is read from the agent row by the INSERT itself
+    with transaction() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO audit_log (
-                log_id, agent_id, action, resource, timestamp,
-                human_authority, success, metadata_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            log_id, agent_id, action, resource, now,
-            human_authority, int(success),
-            json.dumps(metadata) if metadata else None
+        cursor.execute(_SQL_LOG_ACTION, (
+            log_id, action, resource, now, int(success),
+            metadata_json if metadata_json is not None else encode_metadata(metadata),
+            agent_id
         ))
-        conn.commit()
+        # Drain the cursor so the statement completes before the commit
+        rows = cursor.fetchall()
+    
+    if not rows:
+        return None
     
     return {
-        "log_id": log_id,
-        "human_authority": human_authority,
+        "log_id": _format_log_id(log_id),
+        "human_authority": rows[0]["human_authority"],
         "recorded_at": now
     }
 
 
+def log_actions_bulk(events: list[dict], missing_ok: bool = False) -> list[Optional[dict]]:
+    """Log several agent actions in a single transaction.
+
+    Each event takes the same keys as `log_action`, plus an optional
+    `timestamp` (nanoseconds) for when it was received. Results are returned
+    in input order. Raises ValueError if any agent does not exist, unless
+    `missing_ok` is set, in which case those events are skipped and their
+    results are None.
+    """
+    now = time.time_ns()
+    agent_ids = list(dict.fromkeys(event["agent_id"] for event in events))
+    
+    # Resolve every agent's authority (and existence) in one query
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_SQL_GET_HUMAN_AUTHORITIES, (serialization.dumps(agent_ids).decode(),))
+        authorities = {row["agent_id"]: row["human_authority"] for row in cursor.fetchall()}
+    
+    missing = [agent_id for agent_id in agent_ids if agent_id not in authorities]
+    if missing and not missing_ok:
+        raise ValueError(f"Agents not found: {missing}")
+    
+    rows = []
+    results = []
+    
+    for event in events:
+        agent_id = event["agent_id"]
+        if agent_id not in authorities:
+            results.append(None)
+            continue
+        log_id = generate_log_id()
+        timestamp = event.get("timestamp") or now
+        metadata_json = event.get("metadata_json")
+        if metadata_json is None:
+            metadata_json = encode_metadata(event.get("metadata"))
+        rows.append((
+            log_id, agent_id, event["action"], event.get("resource"), timestamp,
+            authorities[agent_id], int(event.get("success", True)), metadata_json
+        ))
+        results.append({
+            "log_id": _format_log_id(log_id),
+            "human_authority": authorities[agent_id],
+            "recorded_at": timestamp
+        })
+    
+    if rows:
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(_SQL_INSERT_AUDIT_LOG, rows)
+    
+    return results
+
+
 def get_audit_trace(agent_id: str) -> dict:
     """Get full delegation chain and audit trail for an agent."""
     agent = get_agent(agent_id)
@@ -351,97 +797,119 @@ def get_audit_trace(agent_id: str) -> dict:
     
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT log_id, action, resource, timestamp, success, metadata_json
-            FROM audit_log
-            WHERE agent_id = ?
-            ORDER BY timestamp DESC
-        """, (agent_id,))
+        cursor.row_factory = None
+        cursor.execute(_SQL_GET_AUDIT_TRAIL, (agent_id,))
         rows = cursor.fetchall()
     
     audit_trail = [
         {
-            "log_id": row["log_id"],
-            "action": row["action"],
-            "resource": row["resource"],
-            "timestamp": row["timestamp"],
-            "success": bool(row["success"]),
-            "metadata": json.loads(row["metadata_json"]) if row["metadata_json"] else None
+            "log_id": _format_log_id(log_id),
+            "action": action,
+            "resource": resource,
+            "timestamp": timestamp,
+            "success": bool(success),
+            "metadata": serialization.loads(metadata_json) if metadata_json else None
         }
-        for row in rows
+        for log_id, action, resource, timestamp, success, metadata_json in rows
     ]
     
     return {
         "agent_id": agent_id,
-        "agent_name": agent["agent_name"],
-        "lifecycle_state": agent["lifecycle_state"],
+        "agent_name": agent.agent_name,
+        "lifecycle_state": agent.lifecycle_state,
         "delegation_chain": chain,
-        "delegation_depth": get_delegation_depth(agent_id),
-        "scope": json.loads(agent["scope_json"]) if agent["scope_json"] else [],
+        "delegation_depth": agent.delegation_depth,
+        "scope": agent.scope,
         "audit_trail": audit_trail
     }
 
 
-def check_scope(agent_id: str, required_action: str) -> bool:
-    """Check if agent has the required action in scope."""
-    scope = get_agent_scope(agent_id)
-    return required_action in scope
-
-
-def query_audit_logs(
-    since_timestamp: Optional[int] = None,
-    agent_id: Optional[str] = None,
-    action: Optional[str] = None,
-    human_authority: Optional[str] = None,
-    limit: int = 100
-) -> list[dict]:
-    """Query audit logs with filters."""
+def _audit_log_filter(
+    since_timestamp: Optional[int],
+    agent_id: Optional[str],
+    action: Optional[str],
+    human_authority: Optional[str]
+) -> tuple[str, list]:
+    """Build the WHERE clause and parameters for an audit log query."""
     conditions = []
     params = []
     
     if since_timestamp:
-        conditions.append("timestamp >= ?")
+        conditions.append("al.timestamp >= ?")
         params.append(since_timestamp)
     
     if agent_id:
-        conditions.append("agent_id = ?")
+        conditions.append("al.agent_id = ?")
         params.append(agent_id)
     
     if action:
-        conditions.append("action = ?")
+        conditions.append("al.action = ?")
         params.append(action)
     
     if human_authority:
-        conditions.append("human_authority = ?")
+        conditions.append("al.human_authority = ?")
         params.append(human_authority)
     
     where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return where_clause, params
+
+
+def _audit_log_entry(row: sqlite3.Row) -> dict:
+    """Convert a row selected by _SQL_QUERY_AUDIT_LOGS to its API shape."""
+    return {
+        "log_id": _format_log_id(row["log_id"]),
+        "agent_id": row["agent_id"],
+        "agent_name": row["agent_name"],
+        "action": row["action"],
+        "resource": row["resource"],
+        "timestamp": row["timestamp"],
+        "human_authority": row["human_authority"],
+        "success": bool(row["success"])
+    }
+
+
+def query_audit_logs(
+    since_timestamp: Optional[int] = None,  # nanoseconds
+    agent_id: Optional[str] = None,
+    action: Optional[str] = None,
+    human_authority: Optional[str] = None,
+    limit: int = 100
+) -> list[dict]:
+    """Query audit logs with filters."""
+    where_clause, params = _audit_log_filter(since_timestamp, agent_id, action, human_authority)
     
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT al.*, a.agent_name
-            FROM audit_log al
-            LEFT JOIN agents a ON al.agent_id = a.agent_id
-            WHERE {where_clause}
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, params + [limit])
+        cursor.execute(_SQL_QUERY_AUDIT_LOGS.format(where=where_clause), params + [limit])
         rows = cursor.fetchall()
     
-    return [
-        {
-            "log_id": row["log_id"],
-            "agent_id": row["agent_id"],
-            "agent_name": row["agent_name"],
-            "action": row["action"],
-            "resource": row["resource"],
-            "timestamp": row["timestamp"],
-            "human_authority": row["human_authority"],
-            "success": bool(row["success"])
-        }
-        for row in rows
-    ]
+    return [_audit_log_entry(row) for row in rows]
+
+
+def iter_audit_logs(
+    since_timestamp: Optional[int] = None,  # nanoseconds
+    agent_id: Optional[str] = None,
+    action: Optional[str] = None,
+    human_authority: Optional[str] = None,
+    limit: int = 1000,
+    batch_size: int = 500
+) -> Iterator[dict]:
+    """Yield audit log entries for a query without loading them all at once.
+
+    Rows are read from the cursor in batches of `batch_size`. The generator
+    may be resumed from different threads (e.g. by a streaming response), so
+    it runs on a connection of its own that is closed when it finishes.
+    """
+    where_clause, params = _audit_log_filter(since_timestamp, agent_id, action, human_authority)
+    
+    conn = _connect()
+    try:
+        cursor = conn.execute(_SQL_QUERY_AUDIT_LOGS.format(where=where_clause), params + [limit])
+        while rows := cursor.fetchmany(batch_size):
+            for row in rows:
+                yield _audit_log_entry(row)
+    finally:
+        conn.close()
 
 
 def terminate_agent(agent_id: str, cascade: bool = True) -> dict:
@@ -450,39 +918,19 @@ def terminate_agent(agent_id: str, cascade: bool = True) -> dict:
     if not agent:
         raise ValueError(f"Agent {agent_id} not found")
     
-    terminated = []
-    
-    with get_connection() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
-        now = int(time.time())
-        
-        # Terminate the agent
-        cursor.execute("""
-            UPDATE agents SET lifecycle_state = 'terminated', terminated_at = ?
-            WHERE agent_id = ?
-        """, (now, agent_id))
-        terminated.append(agent_id)
+        now = time.time_ns()
         
         if cascade:
-            # Find all children recursively
-            children_to_check = [agent_id]
-            while children_to_check:
-                current = children_to_check.pop()
-                cursor.execute(
-                    "SELECT child_id FROM delegations WHERE parent_id = ?",
-                    (current,)
-                )
-                for row in cursor.fetchall():
-                    child_id = row["child_id"]
-                    cursor.execute("""
-                        UPDATE agents SET lifecycle_state = 'terminated', terminated_at = ?
-                        WHERE agent_id = ? AND lifecycle_state = 'active'
-                    """, (now, child_id))
-                    if cursor.rowcount > 0:
-                        terminated.append(child_id)
-                        children_to_check.append(child_id)
-        
-        conn.commit()
+            # Terminate the agent and every active descendant in one statement
+            cursor.execute(_SQL_TERMINATE_CASCADE, (agent_id, now, agent_id))
+            descendants = [row["agent_id"] for row in cursor.fetchall() if row["agent_id"] != agent_id]
+        else:
+            cursor.execute(_SQL_TERMINATE_AGENT, (now, agent_id))
+            descendants = []
+    
+    terminated = [agent_id] + descendants
     
     return {
         "terminated": terminated,
@@ -490,32 +938,77 @@ def terminate_agent(agent_id: str, cascade: bool = True) -> dict:
     }
 
 
-def get_all_agents(include_terminated: bool = False) -> list[dict]:
-    """Get all agents."""
+def _list_agents_filter(
+    include_terminated: bool,
+    after_created_at: Optional[int],
+    after_agent_id: Optional[str]
+) -> tuple[str, list]:
+    """Build the WHERE clause and parameters for an agent listing page."""
+    conditions = []
+    params = []
+    
+    if not include_terminated:
+        conditions.append("lifecycle_state = 'active'")
+    
+    if after_created_at is not None:
+        if after_agent_id is not None:
+            conditions.append("(created_at, agent_id) < (?, ?)")
+            params.extend([after_created_at, after_agent_id])
+        else:
+            conditions.append("created_at < ?")
+            params.append(after_created_at)
+    
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    return where_clause, params
+
+
+def get_all_agents_json(
+    include_terminated: bool = False,
+    after_created_at: Optional[int] = None,
+    after_agent_id: Optional[str] = None,
+    limit: Optional[int] = 500
+) -> list[str]:
+    """Return a page of agents, newest first, each as a JSON object string.
+
+    Pass the `created_at` and `agent_id` of the last agent seen to continue
+    from where a previous page ended. `limit=None` returns every agent.
+    """
+    where_clause, params = _list_agents_filter(include_terminated, after_created_at, after_agent_id)
+    
     with get_connection() as conn:
         cursor = conn.cursor()
-        if include_terminated:
-            cursor.execute("SELECT * FROM agents ORDER BY created_at DESC")
-        else:
-            cursor.execute(
-                "SELECT * FROM agents WHERE lifecycle_state = 'active' ORDER BY created_at DESC"
-            )
-        rows = cursor.fetchall()
+        cursor.row_factory = None
+        cursor.execute(
+            _SQL_LIST_AGENTS_JSON.format(where=where_clause),
+            params + [-1 if limit is None else limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_agent_stats() -> dict:
+    """Count agents by lifecycle state, and audit log entries."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(_SQL_COUNT_AGENTS_BY_STATE)
+        by_state = dict(cursor.fetchall())
+        cursor.execute(_SQL_COUNT_AUDIT_LOGS)
+        audit_logs = cursor.fetchone()[0]
     
-    return [
-        {
-            **dict(row),
-            "scope": json.loads(row["scope_json"]) if row["scope_json"] else []
-        }
-        for row in rows
-    ]
+    return {
+        "total": sum(by_state.values()),
+        "active": by_state.get("active", 0),
+        "terminated": by_state.get("terminated", 0),
+        "audit_logs": audit_logs
+    }
 
 
 def reset_database():
     """Reset the database (for demo purposes)."""
-    with get_connection() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM audit_log")
         cursor.execute("DELETE FROM delegations")
         cursor.execute("DELETE FROM agents")
-        conn.commit()
+    
+    _load_agent_scope.cache_clear()
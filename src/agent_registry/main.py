@@ -1,30 +1,53 @@
 """Agent Identity Registry - FastAPI Application."""
+import asyncio
+import os
 import time
-from fastapi import FastAPI, HTTPException, Query
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 
-from . import __version__
+import anyio
+import orjson
+
+try:
+    import ormsgpack
+except ImportError:  # optional: pip install agent-identity-registry[msgpack]
+    ormsgpack = None
+
+from . import __version__, serialization
+from .batching import AuditBatcher
 from .database import (
     init_db,
+    close_connections,
     register_agent,
     get_agent,
+    get_cached_agent_scope,
     spawn_agent,
-    log_action,
+    log_actions_bulk,
+    encode_metadata,
     get_audit_trace,
-    check_scope,
     query_audit_logs,
+    iter_audit_logs,
     terminate_agent,
-    get_all_agents,
-    get_agent_scope,
+    get_all_agents_json,
+    get_agent_stats,
     reset_database,
 )
 from .models import (
     RegisterAgentRequest,
     RegisterAgentResponse,
+    Credentials,
+    ChainLink,
     SpawnAgentRequest,
     SpawnAgentResponse,
     LogActionRequest,
+    LogActionBatchRequest,
     LogActionResponse,
     AuditTraceResponse,
     AuditLogEntry,
@@ -37,11 +60,66 @@ from .models import (
 )
 
 
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson instead of the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return serialization.dumps(content)
+
+
+class ORJSONRoute(APIRoute):
+    """Route that decodes JSON request bodies with orjson.
+
+    The parsed body is cached on the request where FastAPI looks for it.
+    Bodies with integers wider than 64 bits are decoded by the stdlib so they
+    stay exact, and invalid or too deeply nested ones are left to FastAPI so
+    error responses are unchanged.
+    """
+
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+        if self.body_field is None:
+            return original_handler
+
+        async def handler(request: Request) -> Response:
+            body = await request.body()
+            if body:
+                try:
+                    request._json = serialization.loads(body)
+                except (ValueError, RecursionError):
+                    pass
+            return await original_handler(request)
+
+        return handler
+
+
+THREADPOOL_SIZE = 200
+
+CORS_ENABLED = os.environ.get("CORS_ENABLED", "").lower() in ("1", "true", "yes")
+
+audit_batcher = AuditBatcher()
+
+# SQLite allows a single writer; queue write requests here instead of having
+# each one tie up a threadpool worker while it waits for the database lock
+_write_lock = asyncio.Lock()
+
+
+async def _run_write(func, *args, **kwargs):
+    """Run a blocking database write on the threadpool, one at a time."""
+    async with _write_lock:
+        return await run_in_threadpool(func, *args, **kwargs)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database on startup and close connections on shutdown."""
+    # Read endpoints are sync and run on the threadpool; allow more than the default 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     init_db()
+    audit_batcher.start()
     yield
+    await audit_batcher.stop()
+    close_connections()
 
 
 app = FastAPI(
@@ -80,43 +158,156 @@ This API demonstrates key concepts of Agent Identity Governance:
 """,
     version=__version__,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     responses={
         400: {"model": ErrorResponse, "description": "Bad Request"},
         404: {"model": ErrorResponse, "description": "Not Found"},
     },
 )
+app.router.route_class = ORJSONRoute
+
+# Middleware added last runs outermost: GZip sits innermost, CORS wraps it
+
+# List and audit responses repeat the same keys on every row and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
+# CORS for browser-based demos; off unless CORS_ENABLED is set. Credentials
+# stay disabled because they can't be combined with a wildcard origin.
+if CORS_ENABLED:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=False,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-# CORS for demo purposes
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+
+
+def _media_quality(ranges: list[tuple[str, str, float]], media_type: str) -> tuple[float, int]:
+    """Find the q-value for a media type, and how specific the range giving it was.
+
+    Specificity is 2 for an exact match, 1 for type/*, 0 for */* and -1 if no
+    range matches (quality 0).
+    """
+    main_type, sub_type = media_type.split("/")
+    quality, specificity = 0.0, -1
+    for range_type, range_sub, q in ranges:
+        if range_type == main_type and range_sub == sub_type:
+            match = 2
+        elif range_type == main_type and range_sub == "*":
+            match = 1
+        elif range_type == "*" and range_sub == "*":
+            match = 0
+        else:
+            continue
+        if match > specificity or (match == specificity and q > quality):
+            quality, specificity = q, match
+    return quality, specificity
+
+
+@lru_cache(maxsize=256)
+def _msgpack_media_type(accept: str) -> Optional[str]:
+    """Pick the MessagePack media type to answer an Accept header with, if any.
+
+    MessagePack is only sent when the client names it with a q-value above
+    zero and no lower than JSON's; wildcards alone get JSON.
+    """
+    ranges = []
+    for media_range in accept.lower().split(","):
+        media_type, *params = media_range.split(";")
+        main_type, _, sub_type = media_type.strip().partition("/")
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((main_type, sub_type, q))
+
+    json_quality, _ = _media_quality(ranges, "application/json")
+    best = None
+    for media_type in MSGPACK_MEDIA_TYPES:
+        quality, specificity = _media_quality(ranges, media_type)
+        if quality <= 0 or specificity < 2:
+            continue
+        if quality >= json_quality and (best is None or quality > best[0]):
+            best = (quality, media_type)
+    return best[1] if best else None
+
+
+def _negotiated_response(request: Request, content) -> Response:
+    """Encode content as MessagePack if the client prefers it, otherwise JSON."""
+    media_type = ormsgpack is not None and _msgpack_media_type(request.headers.get("accept", ""))
+    if media_type:
+        try:
+            return Response(
+                ormsgpack.packb(content), media_type=media_type, headers={"Vary": "Accept"}
+            )
+        except TypeError:
+            # MessagePack has no integers wider than 64 bits; answer in JSON instead
+            pass
+    return ORJSONResponse(content, headers={"Vary": "Accept"})
+
+
+def _ndjson_chunks(items: Iterable, chunk_size: int = 100) -> Iterator[bytes]:
+    """Encode items as newline-delimited JSON, yielding it in chunks of rows."""
+    chunk = []
+    for item in items:
+        chunk.append(serialization.dumps(item))
+        if len(chunk) >= chunk_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk.clear()
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def _json_array_chunks(rows: Iterable[str], chunk_size: int = 100) -> Iterator[bytes]:
+    """Join already-encoded JSON rows into an array, yielding it in chunks."""
+    yield b"["
+    chunk = []
+    separator = ""
+    for row in rows:
+        chunk.append(separator + row)
+        separator = ","
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk).encode()
+            chunk.clear()
+    chunk.append("]")
+    yield "".join(chunk).encode()
 
 
 # Health & Info
 
+# These never change while the process runs, so encode them once
+_ROOT_BODY = orjson.dumps({
+    "name": "Agent Identity Registry",
+    "version": __version__,
+    "docs": "/docs",
+    "description": "Agent Identity Governance Proof-of-Concept"
+})
+_HEALTH_BODY = HealthResponse(
+    status="healthy",
+    version=__version__,
+    database="sqlite"
+).model_dump_json().encode()
+
+
 @app.get("/", tags=["Info"])
 async def root():
     """API root - basic info."""
-    return {
-        "name": "Agent Identity Registry",
-        "version": __version__,
-        "docs": "/docs",
-        "description": "Agent Identity Governance Proof-of-Concept"
-    }
+    return Response(_ROOT_BODY, media_type="application/json")
 
 
-@app.get("/health", response_model=HealthResponse, tags=["Info"])
+@app.get("/health", responses={200: {"model": HealthResponse}}, tags=["Info"])
 async def health():
     """Health check endpoint."""
-    return HealthResponse(
-        status="healthy",
-        version=__version__,
-        database="sqlite"
-    )
+    return Response(_HEALTH_BODY, media_type="application/json")
 
 
 # Agent Management
@@ -141,14 +332,18 @@ The agent receives:
 async def api_register_agent(request: RegisterAgentRequest):
     """Register a new agent and issue credentials."""
     try:
-        result = register_agent(
+        result = await _run_write(
+            register_agent,
             agent_name=request.agent_name,
             agent_type=request.agent_type.value,
             created_by=request.created_by,
             authority_source=request.authority_source.value,
             scope=request.scope
         )
-        return RegisterAgentResponse(**result)
+        return RegisterAgentResponse.model_construct(
+            agent_id=result["agent_id"],
+            credentials=Credentials.model_construct(**result["credentials"])
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -159,22 +354,20 @@ async def api_register_agent(request: RegisterAgentRequest):
     tags=["Agents"],
     summary="List all agents"
 )
-async def api_list_agents(include_terminated: bool = Query(False)):
-    """List all registered agents."""
-    agents = get_all_agents(include_terminated=include_terminated)
-    return [
-        AgentInfo(
-            agent_id=a["agent_id"],
-            agent_name=a["agent_name"],
-            agent_type=a["agent_type"],
-            created_at=a["created_at"],
-            created_by=a.get("created_by"),
-            authority_source=a["authority_source"],
-            scope=a["scope"],
-            lifecycle_state=a["lifecycle_state"]
-        )
-        for a in agents
-    ]
+def api_list_agents(
+    include_terminated: bool = Query(False),
+    after_created_at: int = Query(None, description="created_at of the last agent on the previous page"),
+    after_agent_id: str = Query(None, description="agent_id of the last agent on the previous page"),
+    limit: int = Query(500, ge=1, le=1000, description="Maximum results")
+):
+    """List registered agents, newest first."""
+    agents = get_all_agents_json(
+        include_terminated=include_terminated,
+        after_created_at=after_created_at,
+        after_agent_id=after_agent_id,
+        limit=limit
+    )
+    return StreamingResponse(_json_array_chunks(agents), media_type="application/json")
 
 
 @app.get(
@@ -183,23 +376,13 @@ async def api_list_agents(include_terminated: bool = Query(False)):
     tags=["Agents"],
     summary="Get agent details"
 )
-async def api_get_agent(agent_id: str):
+def api_get_agent(agent_id: str):
     """Get details for a specific agent."""
     agent = get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
     
-    import json
-    return AgentInfo(
-        agent_id=agent["agent_id"],
-        agent_name=agent["agent_name"],
-        agent_type=agent["agent_type"],
-        created_at=agent["created_at"],
-        created_by=agent.get("created_by"),
-        authority_source=agent["authority_source"],
-        scope=json.loads(agent["scope_json"]) if agent["scope_json"] else [],
-        lifecycle_state=agent["lifecycle_state"]
-    )
+    return agent
 
 
 @app.post(
@@ -219,16 +402,17 @@ Create a sub-agent with delegated authority from a parent agent.
 async def api_spawn_agent(agent_id: str, request: SpawnAgentRequest):
     """Spawn a sub-agent with delegated authority."""
     try:
-        result = spawn_agent(
+        result = await _run_write(
+            spawn_agent,
             parent_id=agent_id,
             agent_name=request.agent_name,
             agent_type=request.agent_type.value,
             scope=request.scope
         )
-        return SpawnAgentResponse(
+        return SpawnAgentResponse.model_construct(
             agent_id=result["agent_id"],
-            credentials=result["credentials"],
-            delegation_chain=result["delegation_chain"],
+            credentials=Credentials.model_construct(**result["credentials"]),
+            delegation_chain=[ChainLink.model_construct(**link) for link in result["delegation_chain"]],
             delegation_depth=result["delegation_depth"]
         )
     except ValueError as e:
@@ -241,20 +425,18 @@ async def api_spawn_agent(agent_id: str, request: SpawnAgentRequest):
     tags=["Agents"],
     summary="Check if action is in scope"
 )
-async def api_check_scope(agent_id: str, action: str = Query(...)):
+def api_check_scope(agent_id: str, action: str = Query(...)):
     """Check if an agent has permission for an action."""
-    agent = get_agent(agent_id)
-    if not agent:
+    cached = get_cached_agent_scope(agent_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
     
-    allowed = check_scope(agent_id, action)
-    scope = get_agent_scope(agent_id)
-    
-    return ScopeCheckResponse(
+    scope, scope_set = cached
+    return ScopeCheckResponse.model_construct(
         agent_id=agent_id,
         action=action,
-        allowed=allowed,
-        agent_scope=scope
+        allowed=action in scope_set,
+        agent_scope=list(scope)
     )
 
 
@@ -270,8 +452,8 @@ async def api_terminate_agent(agent_id: str, request: TerminateAgentRequest = No
         request = TerminateAgentRequest()
     
     try:
-        result = terminate_agent(agent_id, cascade=request.cascade)
-        return TerminateAgentResponse(**result)
+        result = await _run_write(terminate_agent, agent_id, cascade=request.cascade)
+        return TerminateAgentResponse.model_construct(**result)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -294,23 +476,48 @@ The system automatically:
 )
 async def api_log_action(request: LogActionRequest):
     """Log an agent action."""
-    agent = get_agent(request.agent_id)
-    if not agent:
-        raise HTTPException(status_code=404, detail=f"Agent {request.agent_id} not found")
+    # Encode here so bad metadata fails this request alone, not the batch it joins
+    try:
+        metadata_json = encode_metadata(request.metadata)
+    except (TypeError, ValueError, RecursionError) as e:
+        raise HTTPException(status_code=422, detail=f"Metadata cannot be stored: {e}")
     
-    result = log_action(
-        agent_id=request.agent_id,
-        action=request.action,
-        resource=request.resource,
-        success=request.success,
-        metadata=request.metadata
-    )
-    return LogActionResponse(**result)
+    result = await audit_batcher.log({
+        "agent_id": request.agent_id,
+        "action": request.action,
+        "resource": request.resource,
+        "success": request.success,
+        "metadata_json": metadata_json
+    })
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Agent {request.agent_id} not found")
+    return LogActionResponse.model_construct(**result)
+
+
+@app.post(
+    "/audit/log/batch",
+    response_model=list[LogActionResponse],
+    tags=["Audit"],
+    summary="Log several agent actions",
+    description="""
+Log a batch of actions in one request and one database transaction.
+
+Results are returned in the same order as the submitted events. If any
+agent is unknown, nothing is logged.
+"""
+)
+async def api_log_actions_batch(request: LogActionBatchRequest):
+    """Log a batch of agent actions."""
+    try:
+        results = await _run_write(log_actions_bulk, [event.model_dump() for event in request.events])
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return [LogActionResponse.model_construct(**r) for r in results]
 
 
 @app.get(
     "/audit/trace/{agent_id}",
-    response_model=AuditTraceResponse,
+    responses={200: {"model": AuditTraceResponse, "content": {MSGPACK_MEDIA_TYPE: {}}}},
     tags=["Audit"],
     summary="Get full audit trace for an agent",
     description="""
@@ -320,20 +527,23 @@ Returns:
 - Full delegation chain (human → agent_a → agent_b → ...)
 - All logged actions by this agent
 - Agent's current scope and lifecycle state
+
+Send `Accept: application/msgpack` to receive MessagePack instead of JSON.
 """
 )
-async def api_audit_trace(agent_id: str):
+def api_audit_trace(agent_id: str, request: Request):
     """Get full delegation chain and audit trail for an agent."""
     try:
         result = get_audit_trace(agent_id)
-        return AuditTraceResponse(**result)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    # Rows are already plain dicts; skip model validation and jsonable_encoder
+    return _negotiated_response(request, result)
 
 
 @app.get(
     "/audit/query",
-    response_model=list[AuditLogEntry],
+    responses={200: {"model": list[AuditLogEntry], "content": {MSGPACK_MEDIA_TYPE: {}}}},
     tags=["Audit"],
     summary="Query audit logs",
     description="""
@@ -343,10 +553,13 @@ Query audit logs with filters.
 - "Show all actions in the last hour"
 - "Show all actions by a specific agent"
 - "Show all actions authorized by a specific human"
+
+Send `Accept: application/msgpack` to receive MessagePack instead of JSON.
 """
 )
-async def api_query_audit(
-    since: int = Query(None, description="Unix timestamp to filter logs since"),
+def api_query_audit(
+    request: Request,
+    since: int = Query(None, description="Unix timestamp (nanoseconds) to filter logs since"),
     agent_id: str = Query(None, description="Filter by agent ID"),
     action: str = Query(None, description="Filter by action type"),
     human_authority: str = Query(None, description="Filter by human authority"),
@@ -360,7 +573,36 @@ async def api_query_audit(
         human_authority=human_authority,
         limit=limit
     )
-    return [AuditLogEntry(**r) for r in results]
+    return _negotiated_response(request, results)
+
+
+@app.get(
+    "/audit/query.ndjson",
+    tags=["Audit"],
+    summary="Export audit logs as NDJSON",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    description="""
+Same filters as `/audit/query`, streamed as newline-delimited JSON (one
+entry per line) for large exports.
+"""
+)
+def api_export_audit(
+    since: int = Query(None, description="Unix timestamp (nanoseconds) to filter logs since"),
+    agent_id: str = Query(None, description="Filter by agent ID"),
+    action: str = Query(None, description="Filter by action type"),
+    human_authority: str = Query(None, description="Filter by human authority"),
+    limit: int = Query(1000, ge=1, le=100000, description="Maximum results")
+):
+    """Stream audit logs matching the filters as NDJSON."""
+    entries = iter_audit_logs(
+        since_timestamp=since,
+        agent_id=agent_id,
+        action=action,
+        human_authority=human_authority,
+        limit=limit
+    )
+    return StreamingResponse(_ndjson_chunks(entries), media_type="application/x-ndjson")
 
 
 # Demo/Admin endpoints
@@ -373,7 +615,7 @@ async def api_query_audit(
 )
 async def api_reset():
     """Reset the database (demo purposes only)."""
-    reset_database()
+    await _run_write(reset_database)
     init_db()
     return {"status": "reset", "message": "Database cleared"}
 
@@ -383,21 +625,17 @@ async def api_reset():
     tags=["Admin"],
     summary="Get registry statistics"
 )
-async def api_stats():
+def api_stats():
     """Get statistics about the registry."""
-    agents = get_all_agents(include_terminated=True)
-    logs = query_audit_logs(limit=10000)
-    
-    active = sum(1 for a in agents if a["lifecycle_state"] == "active")
-    terminated = sum(1 for a in agents if a["lifecycle_state"] == "terminated")
+    stats = get_agent_stats()
     
     return {
         "agents": {
-            "total": len(agents),
-            "active": active,
-            "terminated": terminated
+            "total": stats["total"],
+            "active": stats["active"],
+            "terminated": stats["terminated"]
         },
         "audit_logs": {
-            "total": len(logs)
+            "total": stats["audit_logs"]
         }
     }
@@ -97,9 +97,19 @@ class LogActionRequest(BaseModel):
     }
 
 
+class LogActionBatchRequest(BaseModel):
+    """Request to log several agent actions at once."""
+    events: list[LogActionRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Actions to log, recorded in a single transaction"
+    )
+
+
 class AuditQueryRequest(BaseModel):
     """Query parameters for audit log search."""
-    since_timestamp: Optional[int] = Field(None, description="Filter logs since this Unix timestamp")
+    since_timestamp: Optional[int] = Field(None, description="Filter logs since this Unix timestamp (nanoseconds)")
     agent_id: Optional[str] = Field(None, description="Filter by agent ID")
     action: Optional[str] = Field(None, description="Filter by action type")
     human_authority: Optional[str] = Field(None, description="Filter by human authority")
@@ -113,26 +123,31 @@ class TerminateAgentRequest(BaseModel):
 
 # Response Models
 
-class Credentials(BaseModel):
+class ResponseModel(BaseModel):
+    """Base for response models, which are never modified once built."""
+    model_config = {"frozen": True}
+
+
+class Credentials(ResponseModel):
     """API credentials for an agent."""
     api_key: str
     expires_at: int
 
 
-class RegisterAgentResponse(BaseModel):
+class RegisterAgentResponse(ResponseModel):
     """Response after registering an agent."""
     agent_id: str
     credentials: Credentials
 
 
-class ChainLink(BaseModel):
+class ChainLink(ResponseModel):
     """A link in the delegation chain."""
     type: Literal["human", "agent"]
     id: str
     name: Optional[str] = None
 
 
-class SpawnAgentResponse(BaseModel):
+class SpawnAgentResponse(ResponseModel):
     """Response after spawning a sub-agent."""
     agent_id: str
     credentials: Credentials
@@ -140,14 +155,14 @@ class SpawnAgentResponse(BaseModel):
     delegation_depth: int
 
 
-class LogActionResponse(BaseModel):
+class LogActionResponse(ResponseModel):
     """Response after logging an action."""
     log_id: str
     human_authority: Optional[str]
     recorded_at: int
 
 
-class AuditEntry(BaseModel):
+class AuditEntry(ResponseModel):
     """A single audit log entry."""
     log_id: str
     action: str
@@ -157,7 +172,7 @@ class AuditEntry(BaseModel):
     metadata: Optional[dict] = None
 
 
-class AuditTraceResponse(BaseModel):
+class AuditTraceResponse(ResponseModel):
     """Full audit trace for an agent."""
     agent_id: str
     agent_name: str
@@ -168,7 +183,7 @@ class AuditTraceResponse(BaseModel):
     audit_trail: list[AuditEntry]
 
 
-class AuditLogEntry(BaseModel):
+class AuditLogEntry(ResponseModel):
     """Audit log entry with agent info."""
     log_id: str
     agent_id: str
@@ -180,13 +195,13 @@ class AuditLogEntry(BaseModel):
     success: bool
 
 
-class TerminateAgentResponse(BaseModel):
+class TerminateAgentResponse(ResponseModel):
     """Response after terminating agents."""
     terminated: list[str]
     count: int
 
 
-class AgentInfo(BaseModel):
+class AgentInfo(ResponseModel):
     """Public agent information."""
     agent_id: str
     agent_name: str
@@ -196,9 +211,11 @@ class AgentInfo(BaseModel):
     authority_source: str
     scope: list[str]
     lifecycle_state: str
+    human_authority: Optional[str] = None
+    delegation_depth: int = 0
 
 
-class ScopeCheckResponse(BaseModel):
+class ScopeCheckResponse(ResponseModel):
     """Response from scope check."""
     agent_id: str
     action: str
@@ -206,13 +223,13 @@ class ScopeCheckResponse(BaseModel):
     agent_scope: list[str]
 
 
-class ErrorResponse(BaseModel):
+class ErrorResponse(ResponseModel):
     """Error response."""
     error: str
     detail: Optional[str] = None
 
 
-class HealthResponse(BaseModel):
+class HealthResponse(ResponseModel):
     """Health check response."""
     status: str
     version: str
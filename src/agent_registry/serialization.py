@@ -0,0 +1,37 @@
+"""JSON encoding with orjson, falling back to the stdlib where orjson can't round-trip a value."""
+import json
+import re
+from typing import Any, Union
+
+import orjson
+
+# orjson only handles integers from -2**63 to 2**64 - 1: wider ones are
+# rejected when encoding and silently become floats when decoding. Only
+# negative numbers of 19 digits and numbers of 20 or more can be out of range;
+# positive 19-digit values (such as nanosecond timestamps) take the fast path.
+_WIDE_INT_BYTES = re.compile(rb"-\d{19}|\d{20}")
+_WIDE_INT_STR = re.compile(r"-\d{19}|\d{20}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as compact JSON bytes."""
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # Integers wider than 64 bits, or strings holding lone surrogates
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode JSON, keeping integers wider than 64 bits exact.
+
+    Raises ValueError (json.JSONDecodeError) if data is not valid JSON.
+    """
+    wide_int = _WIDE_INT_BYTES if isinstance(data, bytes) else _WIDE_INT_STR
+    if not wide_int.search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson also rejects escaped lone surrogates, which the stdlib accepts
+            pass
+    return json.loads(data)
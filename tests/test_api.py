@@ -1,13 +1,30 @@
 """Tests for Agent Identity Registry API."""
+import asyncio
+import json
+import sqlite3
 import pytest
 from fastapi.testclient import TestClient
 
+from src.agent_registry import batching, database, serialization
 from src.agent_registry.main import app
-from src.agent_registry.database import reset_database, init_db
+from src.agent_registry.database import reset_database, init_db, log_action
+
+
+@pytest.fixture(autouse=True, scope="session")
+def tmp_database(tmp_path_factory):
+    """Point the registry at a throwaway database instead of data/registry.db."""
+    original_path = database.DATABASE_PATH
+    database.DATABASE_PATH = tmp_path_factory.mktemp("data") / "registry.db"
+    database.get_db_path.cache_clear()
+    database.close_connections()
+    yield database.DATABASE_PATH
+    database.close_connections()
+    database.DATABASE_PATH = original_path
+    database.get_db_path.cache_clear()
 
 
 @pytest.fixture(autouse=True)
-def clean_db():
+def clean_db(tmp_database):
     """Reset database before each test."""
     init_db()
     reset_database()
@@ -191,3 +208,521 @@ def test_query_by_human_authority():
     logs = query_resp.json()
     assert len(logs) >= 1
     assert all(l["human_authority"] == "user:query_test@example.com" for l in logs)
+
+
+def test_delegation_chain_multi_hop():
+    """Test that a grandchild's chain runs human → parent → child → grandchild."""
+    parent_resp = client.post("/agents/register", json={
+        "agent_name": "RootBot",
+        "agent_type": "autonomous",
+        "created_by": "user:chain@example.com",
+        "scope": ["read:data"]
+    })
+    parent_id = parent_resp.json()["agent_id"]
+    
+    child_id = client.post(f"/agents/{parent_id}/spawn", json={
+        "agent_name": "MiddleBot",
+        "agent_type": "semi-autonomous",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    
+    grandchild_resp = client.post(f"/agents/{child_id}/spawn", json={
+        "agent_name": "LeafBot",
+        "agent_type": "tool",
+        "scope": ["read:data"]
+    })
+    assert grandchild_resp.status_code == 200
+    data = grandchild_resp.json()
+    assert data["delegation_depth"] == 2
+    assert [link["id"] for link in data["delegation_chain"]] == [
+        "user:chain@example.com", parent_id, child_id, data["agent_id"]
+    ]
+
+
+def test_scope_check():
+    """Test scope membership checks."""
+    agent_resp = client.post("/agents/register", json={
+        "agent_name": "ScopedBot",
+        "agent_type": "tool",
+        "created_by": "user:scope@example.com",
+        "scope": ["read:data", "write:data"]
+    })
+    agent_id = agent_resp.json()["agent_id"]
+    
+    allowed = client.get(f"/agents/{agent_id}/scope/check", params={"action": "write:data"})
+    assert allowed.status_code == 200
+    assert allowed.json()["allowed"] is True
+    assert allowed.json()["agent_scope"] == ["read:data", "write:data"]
+    
+    denied = client.get(f"/agents/{agent_id}/scope/check", params={"action": "delete:data"})
+    assert denied.json()["allowed"] is False
+    
+    missing = client.get(f"/agents/{agent_id}x/scope/check", params={"action": "read:data"})
+    assert missing.status_code == 404
+    
+    # A miss isn't cached: the ID answers once an agent with it exists
+    with database.transaction() as conn:
+        conn.execute(
+            "UPDATE agents SET agent_id = ? WHERE agent_id = ?", (f"{agent_id}x", agent_id)
+        )
+    found = client.get(f"/agents/{agent_id}x/scope/check", params={"action": "read:data"})
+    assert found.status_code == 200
+    assert found.json()["allowed"] is True
+
+
+def test_list_agents_pagination():
+    """Test keyset pagination of the agent list."""
+    registered = set()
+    for i in range(5):
+        resp = client.post("/agents/register", json={
+            "agent_name": f"PageBot{i}",
+            "agent_type": "tool",
+            "created_by": "user:pager@example.com",
+            "scope": ["read:data"]
+        })
+        registered.add(resp.json()["agent_id"])
+    
+    first_page = client.get("/agents", params={"limit": 3}).json()
+    assert len(first_page) == 3
+    assert "api_key" not in first_page[0]
+    
+    last = first_page[-1]
+    second_page = client.get("/agents", params={
+        "limit": 3,
+        "after_created_at": last["created_at"],
+        "after_agent_id": last["agent_id"]
+    }).json()
+    assert len(second_page) == 2
+    assert {a["agent_id"] for a in first_page + second_page} == registered
+
+
+def test_audit_log_batch():
+    """Test logging several actions in one request."""
+    agent_resp = client.post("/agents/register", json={
+        "agent_name": "BatchBot",
+        "agent_type": "autonomous",
+        "created_by": "user:batch@example.com",
+        "scope": ["read:data", "write:data"]
+    })
+    agent_id = agent_resp.json()["agent_id"]
+    
+    batch_resp = client.post("/audit/log/batch", json={"events": [
+        {"agent_id": agent_id, "action": "read:data", "resource": "a"},
+        {"agent_id": agent_id, "action": "write:data", "resource": "b"},
+    ]})
+    assert batch_resp.status_code == 200
+    results = batch_resp.json()
+    assert len(results) == 2
+    assert all(r["human_authority"] == "user:batch@example.com" for r in results)
+    
+    trace = client.get(f"/audit/trace/{agent_id}").json()
+    assert len(trace["audit_trail"]) == 2
+    
+    # Events in one batch share a timestamp but still list newest first everywhere
+    newest_first = ["b", "a"]
+    assert [e["resource"] for e in trace["audit_trail"]] == newest_first
+    assert [e["resource"] for e in client.get("/audit/query").json()] == newest_first
+    assert [e["resource"] for e in client.get(
+        "/audit/query", params={"agent_id": agent_id}
+    ).json()] == newest_first
+    
+    # An unknown agent rejects the whole batch
+    bad_resp = client.post("/audit/log/batch", json={"events": [
+        {"agent_id": agent_id, "action": "read:data"},
+        {"agent_id": "agent_missing", "action": "read:data"},
+    ]})
+    assert bad_resp.status_code == 404
+    assert len(client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]) == 2
+
+
+def test_audit_log_batched_writes():
+    """Test that /audit/log goes through the group-commit batcher under the app lifespan."""
+    with TestClient(app) as lifespan_client:
+        agent_resp = lifespan_client.post("/agents/register", json={
+            "agent_name": "QueuedBot",
+            "agent_type": "autonomous",
+            "created_by": "user:queue@example.com",
+            "scope": ["read:data"]
+        })
+        agent_id = agent_resp.json()["agent_id"]
+        
+        for resource in ("a", "b", "c"):
+            log_resp = lifespan_client.post("/audit/log", json={
+                "agent_id": agent_id,
+                "action": "read:data",
+                "resource": resource
+            })
+            assert log_resp.status_code == 200
+            assert log_resp.json()["human_authority"] == "user:queue@example.com"
+        
+        # Committed by the time the request returns, newest first
+        trail = lifespan_client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]
+        assert [entry["resource"] for entry in trail] == ["c", "b", "a"]
+        
+        missing_resp = lifespan_client.post("/audit/log", json={
+            "agent_id": "agent_missing",
+            "action": "read:data"
+        })
+        assert missing_resp.status_code == 404
+
+
+def test_admin_stats():
+    """Test registry statistics counts."""
+    parent = client.post("/agents/register", json={
+        "agent_name": "StatsParent",
+        "agent_type": "autonomous",
+        "created_by": "user:stats@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    child = client.post(f"/agents/{parent}/spawn", json={
+        "agent_name": "StatsChild",
+        "agent_type": "tool",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    client.post("/audit/log", json={"agent_id": parent, "action": "read:data"})
+    client.post(f"/agents/{child}/terminate", json={"cascade": False})
+    
+    stats = client.get("/admin/stats").json()
+    assert stats["agents"] == {"total": 2, "active": 1, "terminated": 1}
+    assert stats["audit_logs"]["total"] == 1
+
+
+def test_large_responses_are_compressed():
+    """Test that list responses over the size threshold are gzipped."""
+    for i in range(10):
+        client.post("/agents/register", json={
+            "agent_name": f"GzipBot{i}",
+            "agent_type": "tool",
+            "created_by": "user:gzip@example.com",
+            "scope": ["read:data"]
+        })
+    
+    response = client.get("/agents", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 10
+    
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_audit_export_ndjson():
+    """Test streaming audit logs as newline-delimited JSON."""
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "ExportBot",
+        "agent_type": "tool",
+        "created_by": "user:export@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    for resource in ("a", "b", "c"):
+        client.post("/audit/log", json={"agent_id": agent_id, "action": "read:data", "resource": resource})
+    
+    response = client.get("/audit/query.ndjson", params={"agent_id": agent_id})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    
+    entries = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["resource"] for e in entries] == ["c", "b", "a"]
+    assert entries == client.get("/audit/query", params={"agent_id": agent_id}).json()
+
+
+def test_audit_query_msgpack():
+    """Test MessagePack content negotiation on audit queries."""
+    ormsgpack = pytest.importorskip("ormsgpack")
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "PackBot",
+        "agent_type": "tool",
+        "created_by": "user:pack@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    client.post("/audit/log", json={"agent_id": agent_id, "action": "read:data"})
+    
+    packed = client.get("/audit/query", params={"agent_id": agent_id},
+                        headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert ormsgpack.unpackb(packed.content) == client.get(
+        "/audit/query", params={"agent_id": agent_id}
+    ).json()
+    
+    trace = client.get(f"/audit/trace/{agent_id}", headers={"Accept": "application/msgpack"})
+    assert ormsgpack.unpackb(trace.content)["agent_name"] == "PackBot"
+    
+    for accept, media_type in [
+        ("application/x-msgpack", "application/x-msgpack"),
+        ("application/json;q=0.5, application/msgpack", "application/msgpack"),
+        ("application/msgpack;q=0", "application/json"),
+        ("application/json, application/msgpack;q=0.9", "application/json"),
+        ("*/*", "application/json"),
+    ]:
+        response = client.get(f"/audit/trace/{agent_id}", headers={"Accept": accept})
+        assert response.headers["content-type"] == media_type, accept
+
+
+def test_invalid_json_body():
+    """Test that malformed JSON bodies still get FastAPI's validation error."""
+    response = client.post(
+        "/audit/log",
+        content=b'{"agent_id": "agent_x", "action": ',
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+
+def test_deeply_nested_json_body():
+    """Test that a body too deeply nested to parse is a 400, not a server error."""
+    nested = b"[" * 5000 + b"]" * 5000
+    response = client.post(
+        "/audit/log",
+        content=b'{"agent_id": "a", "action": "r", "metadata": {"x": %s}}' % nested,
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "There was an error parsing the body"
+
+
+def test_metadata_outside_orjson_range():
+    """Test logging metadata orjson can't encode: lone surrogates, >64-bit integers."""
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "EdgeBot",
+        "agent_type": "tool",
+        "created_by": "user:edge@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    
+    response = client.post(
+        "/audit/log",
+        content=b'{"agent_id": "%s", "action": "read:data", "metadata": {"s": "\\ud800"}}' % agent_id.encode(),
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 200
+    assert log_action(agent_id, "read:data", metadata={"n": 10**30}) is not None
+    
+    trail = client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]
+    assert [entry["metadata"] for entry in trail] == [{"n": 10**30}, {"s": "\ud800"}]
+    
+    # Scopes take the same path, so an agent can be registered with one
+    response = client.post(
+        "/agents/register",
+        content=b'{"agent_name": "EdgeBot", "agent_type": "tool", '
+                b'"created_by": "user:edge@example.com", "scope": ["read:\\ud800"]}',
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 200
+    edge_id = response.json()["agent_id"]
+    assert client.get(f"/agents/{edge_id}").json()["scope"] == ["read:\ud800"]
+    assert client.get(f"/agents/{edge_id}/scope/check", params={"action": "read:data"}).json()["allowed"] is False
+
+
+def test_wide_integer_metadata_is_exact():
+    """Test that a >64-bit integer in metadata survives unchanged."""
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "BigIntBot",
+        "agent_type": "tool",
+        "created_by": "user:bigint@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    
+    response = client.post("/audit/log", json={
+        "agent_id": agent_id,
+        "action": "read:data",
+        "metadata": {"n": 123456789012345678901234567891}
+    })
+    assert response.status_code == 200
+    
+    trail = client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]
+    assert trail[0]["metadata"] == {"n": 123456789012345678901234567891}
+    
+    # MessagePack can't carry it, so the trace falls back to JSON
+    packed = client.get(f"/audit/trace/{agent_id}", headers={"Accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/json"
+    assert packed.json()["audit_trail"][0]["metadata"] == {"n": 123456789012345678901234567891}
+
+
+def test_timestamps_decode_on_fast_path(monkeypatch):
+    """Test that only integers that can overflow 64 bits skip orjson."""
+    wide = b'{"low": -9999999999999999999, "high": 99999999999999999999}'
+    assert serialization.loads(wide) == {"low": -9999999999999999999, "high": 99999999999999999999}
+    
+    def stdlib_loads(data):
+        raise AssertionError("decoded with the stdlib")
+    
+    monkeypatch.setattr(serialization.json, "loads", stdlib_loads)
+    timestamp = 1790000000000000000
+    assert serialization.loads(b'{"recorded_at": %d}' % timestamp) == {"recorded_at": timestamp}
+    assert serialization.loads('{"since": %d}' % timestamp) == {"since": timestamp}
+
+
+def test_audit_batch_failure_is_isolated(monkeypatch):
+    """Test that one failing event doesn't fail the other events in its batch."""
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "IsolatedBot",
+        "agent_type": "tool",
+        "created_by": "user:isolated@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    
+    real_log_actions_bulk = batching.log_actions_bulk
+    
+    def failing_log_actions_bulk(events, **kwargs):
+        if any(event["action"] == "explode" for event in events):
+            raise RuntimeError("bad event")
+        return real_log_actions_bulk(events, **kwargs)
+    
+    monkeypatch.setattr(batching, "log_actions_bulk", failing_log_actions_bulk)
+    
+    async def log_concurrently():
+        batcher = batching.AuditBatcher(batch_size=100)
+        batcher.start()
+        actions = ["read:data"] * 5 + ["explode"] + ["read:data"] * 5
+        results = await asyncio.gather(
+            *(batcher.log({"agent_id": agent_id, "action": action}) for action in actions),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+    
+    results = asyncio.run(log_concurrently())
+    assert isinstance(results[5], RuntimeError)
+    assert all(isinstance(r, dict) for i, r in enumerate(results) if i != 5)
+    assert len(client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]) == 10
+
+
+def test_audit_batcher_flushes_lone_event_immediately():
+    """Test that an event arriving alone is committed without waiting for company."""
+    agent_id = client.post("/agents/register", json={
+        "agent_name": "PromptBot",
+        "agent_type": "tool",
+        "created_by": "user:prompt@example.com",
+        "scope": ["read:data"]
+    }).json()["agent_id"]
+    
+    async def log_sequentially():
+        batcher = batching.AuditBatcher()
+        batcher.start()
+        loop = asyncio.get_running_loop()
+        timings = []
+        for _ in range(5):
+            started = loop.time()
+            await batcher.log({"agent_id": agent_id, "action": "read:data"})
+            timings.append(loop.time() - started)
+        await batcher.stop()
+        return timings
+    
+    # The batcher used to hold every batch open for 50 ms
+    assert max(asyncio.run(log_sequentially())) < 0.025
+    assert len(client.get(f"/audit/trace/{agent_id}").json()["audit_trail"]) == 5
+
+
+_LEGACY_SCHEMA = """
+    CREATE TABLE agents (
+        agent_id TEXT PRIMARY KEY,
+        agent_name TEXT NOT NULL,
+        agent_type TEXT CHECK(agent_type IN ('autonomous', 'semi-autonomous', 'tool')),
+        created_at INTEGER NOT NULL,
+        created_by TEXT,
+        authority_source TEXT CHECK(authority_source IN ('human', 'delegated', 'policy')),
+        scope_json TEXT,
+        lifecycle_state TEXT CHECK(lifecycle_state IN ('active', 'suspended', 'terminated')) DEFAULT 'active',
+        terminated_at INTEGER,
+        api_key TEXT,
+        api_key_expires_at INTEGER
+    );
+    CREATE TABLE delegations (
+        delegation_id TEXT PRIMARY KEY,
+        parent_id TEXT NOT NULL,
+        child_id TEXT NOT NULL,
+        delegated_at INTEGER NOT NULL,
+        delegation_depth INTEGER,
+        FOREIGN KEY (parent_id) REFERENCES agents(agent_id),
+        FOREIGN KEY (child_id) REFERENCES agents(agent_id)
+    );
+    CREATE TABLE audit_log (
+        log_id TEXT PRIMARY KEY,
+        agent_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        resource TEXT,
+        timestamp INTEGER NOT NULL,
+        human_authority TEXT,
+        success INTEGER,
+        metadata_json TEXT,
+        FOREIGN KEY (agent_id) REFERENCES agents(agent_id)
+    );
+    CREATE INDEX idx_delegations_parent ON delegations(parent_id);
+    CREATE INDEX idx_delegations_child ON delegations(child_id);
+    CREATE INDEX idx_audit_agent ON audit_log(agent_id);
+    CREATE INDEX idx_audit_timestamp ON audit_log(timestamp);
+"""
+
+
+def test_legacy_database_upgrade(tmp_path, monkeypatch):
+    """Test that init_db() upgrades a database written by the seconds-based schema."""
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript(_LEGACY_SCHEMA)
+    legacy.executemany(
+        "INSERT INTO agents (agent_id, agent_name, agent_type, created_at, created_by, "
+        "authority_source, scope_json, api_key, api_key_expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("agent_root", "RootBot", "autonomous", 1700000000, "user:legacy@example.com",
+             "human", '["read:data"]', "air_root", 1731536000),
+            ("agent_mid", "MidBot", "semi-autonomous", 1700000010, "agent_root",
+             "delegated", '["read:data"]', "air_mid", 1731536010),
+            ("agent_leaf", "LeafBot", "tool", 1700000020, "agent_mid",
+             "delegated", '["read:data"]', "air_leaf", 1731536020),
+        ]
+    )
+    legacy.executemany(
+        "INSERT INTO delegations VALUES (?, ?, ?, ?, ?)",
+        [
+            ("del_1", "agent_root", "agent_mid", 1700000010, 1),
+            ("del_2", "agent_mid", "agent_leaf", 1700000020, 2),
+        ]
+    )
+    legacy.executemany(
+        "INSERT INTO audit_log VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("log_1", "agent_leaf", "read:data", "a", 1700000030, "user:legacy@example.com", 1, None),
+            ("log_2", "agent_leaf", "read:data", "b", 1700000040, "user:legacy@example.com", 1, '{"n": 1}'),
+        ]
+    )
+    legacy.commit()
+    legacy.close()
+    
+    original_path = database.DATABASE_PATH
+    database.DATABASE_PATH = path
+    database.get_db_path.cache_clear()
+    database.close_connections()
+    try:
+        init_db()
+        
+        leaf = database.get_agent("agent_leaf")
+        assert leaf.created_at == 1700000020 * 10**9
+        assert leaf.human_authority == "user:legacy@example.com"
+        assert leaf.delegation_depth == 2
+        assert database.get_agent("agent_mid").human_authority == "user:legacy@example.com"
+        assert database.get_agent("agent_root").delegation_depth == 0
+        
+        trace = database.get_audit_trace("agent_leaf")
+        assert [entry["log_id"] for entry in trace["audit_trail"]] == ["log_2", "log_1"]
+        assert [entry["timestamp"] for entry in trace["audit_trail"]] == [1700000040 * 10**9, 1700000030 * 10**9]
+        assert [link["id"] for link in trace["delegation_chain"]] == [
+            "user:legacy@example.com", "agent_root", "agent_mid", "agent_leaf"
+        ]
+        
+        with database.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+            assert conn.execute(
+                "SELECT delegated_at FROM delegations WHERE delegation_id = 'del_2'"
+            ).fetchone()[0] == 1700000020 * 10**9
+        
+        # Once upgraded, init_db() returns before taking the write lock
+        def no_transaction():
+            raise AssertionError("init_db() started a transaction")
+        
+        monkeypatch.setattr(database, "transaction", no_transaction)
+        init_db()
+        assert database.get_agent("agent_leaf").created_at == 1700000020 * 10**9
+    finally:
+        database.close_connections()
+        database.DATABASE_PATH = original_path
+        database.get_db_path.cache_clear()